@@ -32,6 +32,7 @@ setup(
         "matplotlib>=2.2.2",
         "anndata>=0.8.0",
         "scanpy>=1.6.0",
+        "numba",
         "mellon>=1.3.0",
         "pygam",
     ],
@@ -14,7 +14,7 @@ from sklearn.neighbors import NearestNeighbors
 from joblib import Parallel, delayed
 from scipy.sparse.linalg import eigs
 
-from scipy.sparse import csr_matrix, find, csgraph
+from scipy.sparse import csr_matrix, csgraph
 from scipy.stats import entropy, pearsonr, norm
 from numpy.linalg import inv, pinv, LinAlgError
 from copy import deepcopy
@@ -420,17 +420,18 @@ def _construct_markov_chain(wp_data, knn, pseudotime, n_jobs):
     kNN[x, ind[x, y]] = 0
 
     # Affinity matrix and markov chain
-    x, y, z = find(kNN)
+    kNN.eliminate_zeros()
+    x = np.repeat(np.arange(len(waypoints)), np.diff(kNN.indptr))
+    y, z = kNN.indices, kNN.data
     aff = np.exp(
         -(z**2) / (adaptive_std[x] ** 2) * 0.5
         - (z**2) / (adaptive_std[y] ** 2) * 0.5
     )
-    W = csr_matrix((aff, (x, y)), [len(waypoints), len(waypoints)])
+    W = csr_matrix((aff, y, kNN.indptr), [len(waypoints), len(waypoints)])
 
     # Transition matrix
     D = np.ravel(W.sum(axis=1))
-    x, y, z = find(W)
-    T = csr_matrix((z / D[x], (x, y)), [len(waypoints), len(waypoints)])
+    T = csr_matrix((aff / D[x], y, kNN.indptr), [len(waypoints), len(waypoints)])
 
     return T
 
@@ -458,9 +459,11 @@ def _terminal_states_from_markov_chain(T, wp_data, pseudotime):
     cells = ranks.index[ranks > cutoff]
 
     # Find connected components
-    T_dense = pd.DataFrame(T.todense(), index=waypoints, columns=waypoints)
-    graph = nx.from_pandas_adjacency(T_dense.loc[cells, cells])
-    cells = [pseudotime[list(i)].idxmax() for i in nx.connected_components(graph)]
+    idx = waypoints.get_indexer(cells)
+    _, labels = csgraph.connected_components(
+        T[idx, :][:, idx], directed=True, connection="weak"
+    )
+    cells = [pseudotime[cells[labels == i]].idxmax() for i in np.unique(labels)]
 
     # Nearest diffusion map boundaries
     terminal_states = [
@@ -420,6 +420,7 @@ def cluster_gene_trends(
     genes: Optional[List[str]] = None,
     gene_trend_key: Optional[str] = "gene_trends",
     n_neighbors: int = 150,
+    transformer=None,
     **kwargs,
 ) -> pd.Series:
     """
@@ -442,6 +443,11 @@ def cluster_gene_trends(
         Key to access gene trends in the AnnData object's varm. Default is 'palantir_gene_trends'.
     n_neighbors : int, optional
         The number of nearest neighbors to use for the k-NN graph construction. Default is 150.
+    transformer : optional
+        Neighbor search backend passed on to `sc.pp.neighbors`, e.g., an approximate
+        nearest neighbor transformer such as `pynndescent.PyNNDescentTransformer`.
+        Requires `scanpy>=1.10.0`. If None, scanpy's default neighbor search is used.
+        Default is None.
     **kwargs
         Additional keyword arguments passed to `scanpy.tl.leiden`.
 
@@ -477,7 +483,10 @@ def cluster_gene_trends(
     )
 
     gt_ad = sc.AnnData(trends.values, dtype=np.float32)
-    sc.pp.neighbors(gt_ad, n_neighbors=n_neighbors, use_rep="X")
+    neighbors_kwargs = dict()
+    if transformer is not None:
+        neighbors_kwargs["transformer"] = transformer
+    sc.pp.neighbors(gt_ad, n_neighbors=n_neighbors, use_rep="X", **neighbors_kwargs)
     sc.tl.leiden(gt_ad, **kwargs)
 
     communities = pd.Series(gt_ad.obs["leiden"].values, index=trends.index)
@@ -5,9 +5,16 @@ import numpy as np
 
 from joblib import Parallel, delayed
 import gc
+import math
+from numba import njit, prange
 
-from scipy.sparse import csr_matrix, find, issparse, hstack
-from scipy.sparse.linalg import eigs
+from scipy.sparse import csr_matrix, issparse
+from scipy.sparse.linalg import eigs, eigsh
+
+try:
+    from scipy.sparse._sparsetools import csr_matvecs
+except ImportError:
+    csr_matvecs = None
 import mellon
 import scanpy as sc
 
@@ -69,12 +76,19 @@ def run_pca(
         except IndexError:
             n_comps = n_components
 
-    # Rerun with selection number of components
     n_comps = min(n_comps, ad.n_obs - 1, ad.n_vars - 1)
-    kwargs = dict()
-    if use_hvg:
-        kwargs["mask_var"] = "highly_variable"
-    sc.pp.pca(ad, n_comps=n_comps, zero_center=False, **kwargs)
+    if use_hvg and n_comps <= l_n_comps:
+        # Truncating the larger fit is more accurate than a smaller randomized refit
+        ad.obsm["X_pca"] = ad.obsm["X_pca"][:, :n_comps]
+        ad.varm["PCs"] = ad.varm["PCs"][:, :n_comps]
+        for key in ["variance", "variance_ratio"]:
+            ad.uns["pca"][key] = ad.uns["pca"][key][:n_comps]
+    else:
+        # Rerun with selection number of components
+        kwargs = dict()
+        if use_hvg:
+            kwargs["mask_var"] = "highly_variable"
+        sc.pp.pca(ad, n_comps=n_comps, zero_center=False, **kwargs)
 
     if isinstance(data, sc.AnnData):
         data.obsm[pca_key] = ad.obsm["X_pca"]
@@ -298,12 +312,41 @@ def run_density_evaluation(
     return log_density
 
 
+@njit(parallel=True, fastmath=True, cache=True)
+def _adaptive_kernel_data(indptr, data, adaptive_std, out):
+    for i in prange(len(indptr) - 1):
+        for k in range(indptr[i], indptr[i + 1]):
+            if data[k] == 0 or adaptive_std[i] == 0:
+                # zero-distance neighbors are no edges, a zero bandwidth gives exp(-inf)
+                out[k] = 0
+            else:
+                out[k] = math.exp(-data[k] / adaptive_std[i])
+    return out
+
+
+def _adaptive_std(kNN, adaptive_k):
+    N = kNN.shape[0]
+    nnz_per_row = kNN.nnz // N
+    if kNN.nnz == N * nnz_per_row and np.all(np.diff(kNN.indptr) == nnz_per_row):
+        # uniform-degree graph: select all k-th distances in a single pass
+        dists_2d = kNN.data.reshape(N, nnz_per_row)
+        return np.partition(dists_2d, adaptive_k - 1, axis=1)[:, adaptive_k - 1]
+    adaptive_std = np.zeros(N)
+    for i in np.arange(N):
+        adaptive_std[i] = np.partition(
+            kNN.data[kNN.indptr[i] : kNN.indptr[i + 1]], adaptive_k - 1
+        )[adaptive_k - 1]
+    return adaptive_std
+
+
 def compute_kernel(
     data: Union[pd.DataFrame, sc.AnnData],
     knn: int = 30,
     alpha: float = 0,
     pca_key: str = "X_pca",
     kernel_key: str = "DM_Kernel",
+    dtype: type = np.float32,
+    transformer=None,
 ) -> csr_matrix:
     """
     Compute the adaptive anisotropic diffusion kernel.
@@ -321,6 +364,17 @@ def compute_kernel(
         Key to retrieve PCA projections from data if it is a sc.AnnData object. Default is 'X_pca'.
     kernel_key : str, optional
         Key to store the kernel in obsp of data if it is a sc.AnnData object. Default is 'DM_Kernel'.
+    dtype : type, optional
+        Floating point type of the kernel. Single precision halves the memory traffic
+        of the downstream sparse products. Use np.float64 for full precision.
+        Default is np.float32.
+    transformer : optional
+        Neighbor search backend passed on to `sc.pp.neighbors`, e.g., an approximate
+        nearest neighbor transformer such as `pynndescent.PyNNDescentTransformer(n_neighbors=knn)`
+        or `sklearn_ann.kneighbors.annoy.AnnoyTransformer(knn)`. The transformer's
+        self-edge of each cell is removed from the graph.
+        Requires `scanpy>=1.10.0`. If None, scanpy's default neighbor search is used.
+        Default is None.
 
     Returns
     -------
@@ -336,27 +390,36 @@ def compute_kernel(
 
     N = data_df.shape[0]
     temp = sc.AnnData(data_df.values)
-    sc.pp.neighbors(temp, n_pcs=0, n_neighbors=knn)
+    neighbors_kwargs = dict()
+    if transformer is not None:
+        neighbors_kwargs["transformer"] = transformer
+    sc.pp.neighbors(temp, n_pcs=0, n_neighbors=knn, **neighbors_kwargs)
     kNN = temp.obsp["distances"]
+    if transformer is not None:
+        # transformers report each cell as its own neighbor
+        rows = np.repeat(np.arange(N), np.diff(kNN.indptr))
+        keep = rows != kNN.indices
+        indptr = np.append(0, np.cumsum(np.bincount(rows[keep], minlength=N)))
+        kNN = csr_matrix((kNN.data[keep], kNN.indices[keep], indptr), shape=[N, N])
+    # canonical CSR keeps the column gathers below and the symmetrization cache friendly
+    kNN.sort_indices()
 
     adaptive_k = int(np.floor(knn / 3))
-    adaptive_std = np.zeros(N)
-    for i in np.arange(N):
-        adaptive_std[i] = np.sort(kNN.data[kNN.indptr[i] : kNN.indptr[i + 1]])[
-            adaptive_k - 1
-        ]
+    adaptive_std = _adaptive_std(kNN, adaptive_k)
 
-    x, y, dists = find(kNN)
-    dists /= adaptive_std[x]
-    W = csr_matrix((np.exp(-dists), (x, y)), shape=[N, N])
+    affinities = _adaptive_kernel_data(
+        kNN.indptr, kNN.data, adaptive_std, np.empty(kNN.nnz, dtype=dtype)
+    )
+    W = csr_matrix((affinities, kNN.indices, kNN.indptr), shape=[N, N])
 
     kernel = W + W.T
 
     if alpha > 0:
         D = np.ravel(kernel.sum(axis=1))
         D[D != 0] = D[D != 0] ** (-alpha)
-        mat = csr_matrix((D, (range(N), range(N))), shape=[N, N])
-        kernel = mat.dot(kernel).dot(mat)
+        # diag(D) @ kernel @ diag(D) as in-place scaling of the nonzero entries
+        rows = np.repeat(np.arange(N), np.diff(kernel.indptr))
+        kernel.data *= D[rows] * D[kernel.indices]
 
     if isinstance(data, sc.AnnData):
         data.obsp[kernel_key] = kernel
@@ -375,7 +438,8 @@ def diffusion_maps_from_kernel(
     kernel : csr_matrix
         Precomputed kernel matrix.
     n_components : int
-        Number of diffusion components to compute. Default is 10.
+        Number of diffusion components to compute. If this exceeds the number of cells
+        minus two, a dense eigendecomposition is used. Default is 10.
     seed : Union[int, None]
         Seed for random initialization. Default is 0.
 
@@ -387,20 +451,51 @@ def diffusion_maps_from_kernel(
     N = kernel.shape[0]
     D = np.ravel(kernel.sum(axis=1))
     D[D != 0] = 1 / D[D != 0]
-    T = csr_matrix((D, (range(N), range(N))), shape=[N, N]).dot(kernel)
+    # diag(D) @ kernel as in-place scaling of the rows
+    T = csr_matrix(kernel, copy=True)
+    rows = np.repeat(np.arange(N), np.diff(T.indptr))
+    T.data = T.data * D[rows]
+
+    # ARPACK can only compute up to N - 2 eigenpairs, use a dense solver otherwise
+    dense = n_components >= N - 1
+    if dense:
+        warn(
+            f"Computing {n_components} diffusion components for only {N} cells. "
+            "Falling back to a dense eigendecomposition."
+        )
 
     np.random.seed(seed)
     v0 = np.random.rand(min(T.shape))
-    D, V = eigs(T, n_components, tol=1e-4, maxiter=1000, v0=v0)
+    if (abs(kernel - kernel.T) > 0).nnz == 0:
+        # T is similar to the symmetric S = diag(D)^(1/2) @ kernel @ diag(D)^(1/2)
+        # which has the same eigenvalues and allows for the real symmetric solver
+        D_sqrt = np.sqrt(D)
+        S = csr_matrix(kernel, copy=True)
+        S.data = S.data * D_sqrt[rows] * D_sqrt[S.indices]
+        if dense:
+            D, V = np.linalg.eigh(S.toarray())
+        else:
+            D, V = eigsh(S, n_components, tol=1e-4, maxiter=1000, v0=v0)
+        V = D_sqrt[:, None] * V
+    else:
+        if dense:
+            D, V = np.linalg.eig(T.toarray())
+        else:
+            D, V = eigs(T, n_components, tol=1e-4, maxiter=1000, v0=v0)
+        D = np.real(D)
+        V = np.real(V)
+
+    if dense:
+        # keep the components of largest magnitude as ARPACK would
+        inds = np.argsort(np.abs(D))[::-1][:n_components]
+        D = D[inds]
+        V = V[:, inds]
 
-    D = np.real(D)
-    V = np.real(V)
     inds = np.argsort(D)[::-1]
     D = D[inds]
     V = V[:, inds]
 
-    for i in range(V.shape[1]):
-        V[:, i] = V[:, i] / np.linalg.norm(V[:, i])
+    V = V / np.linalg.norm(V, axis=0, keepdims=True)
 
     return {"T": T, "EigenVectors": pd.DataFrame(V), "EigenValues": pd.Series(D)}
 
@@ -416,6 +511,8 @@ def run_diffusion_maps(
     sim_key: str = "DM_Similarity",
     eigval_key: str = "DM_EigenValues",
     eigvec_key: str = "DM_EigenVectors",
+    dtype: type = np.float32,
+    transformer=None,
 ):
     """
     Run Diffusion maps using the adaptive anisotropic kernel.
@@ -445,6 +542,11 @@ def run_diffusion_maps(
         Key to store the EigenValues in uns of data if it is a sc.AnnData object. Default is 'DM_EigenValues'.
     eigvec_key : str, optional
         Key to store the EigenVectors in obsm of data if it is a sc.AnnData object. Default is 'DM_EigenVectors'.
+    dtype : type, optional
+        Floating point type of the kernel and diffusion operator. Use np.float64 for full precision.
+        Default is np.float32.
+    transformer : optional
+        Neighbor search backend for the kernel construction, see `compute_kernel`. Default is None.
 
     Returns
     -------
@@ -463,14 +565,16 @@ def run_diffusion_maps(
         raise ValueError("'data_df' should be a pd.DataFrame or sc.AnnData")
 
     if not issparse(data_df):
-        kernel = compute_kernel(data_df, knn, alpha)
+        kernel = compute_kernel(
+            data_df, knn, alpha, dtype=dtype, transformer=transformer
+        )
     else:
         warn(
             "'data' is a sparse matrix and will be interpreted as kernel. "
             "To avoid this warning compute diffusion maps from a precompued kernel using "
             "palantir.utils.diffusion_maps_from_kernel()."
         )
-        kernel = data_df
+        kernel = data_df.astype(dtype)
 
     res = diffusion_maps_from_kernel(kernel, n_components, seed)
 
@@ -487,8 +591,68 @@ def run_diffusion_maps(
     return res
 
 
-def _dot_helper_func(x, y):
-    return x.dot(y)
+def _dot_into(T, X, out):
+    if not issparse(T):
+        np.dot(T, X, out=out)
+    elif csr_matvecs is not None:
+        out.fill(0)
+        try:
+            csr_matvecs(
+                T.shape[0],
+                T.shape[1],
+                X.shape[1],
+                T.indptr,
+                T.indices,
+                T.data,
+                X.ravel(),
+                out.ravel(),
+            )
+        except (TypeError, ValueError):
+            # private scipy routine, its signature is not guaranteed
+            out[:] = T.dot(X)
+    else:
+        out[:] = T.dot(X)
+
+
+def _diffusion_helper_func(T, X, n_steps):
+    if issparse(X):
+        X = X.toarray()
+    # alternate between two preallocated buffers instead of allocating every step
+    X = np.array(X, dtype=T.dtype, order="C")
+    out = np.empty_like(X)
+    for _ in range(n_steps):
+        _dot_into(T, X, out)
+        X, out = out, X
+    return X
+
+
+def _gpu_diffusion_helper(T, X, n_steps, dtype):
+    try:
+        import cupy
+        import cupyx.scipy.sparse
+    except ModuleNotFoundError:
+        raise Exception(
+            "Running the diffusion on the GPU requires the python module `cupy` to be installed."
+        )
+    T_gpu = cupyx.scipy.sparse.csr_matrix(csr_matrix(T, dtype=dtype))
+    X_gpu = cupy.asarray(X.toarray() if issparse(X) else X, dtype=dtype)
+    for _ in range(n_steps):
+        X_gpu = T_gpu.dot(X_gpu)
+    return cupy.asnumpy(X_gpu)
+
+
+def _eigen_diffusion_helper(V, D, degrees, X, n_steps, dtype):
+    V = np.asarray(V, dtype=dtype)
+    # The right eigenvectors of T = diag(1/degrees) @ kernel are orthogonal with respect
+    # to the degree weighting, the scaled left eigenvectors give the spectral projection
+    U = V * np.asarray(degrees, dtype=dtype)[:, None]
+    U /= np.sum(U * V, axis=0, keepdims=True)
+    if issparse(X):
+        coefficients = X.T.dot(U).T
+    else:
+        coefficients = U.T.dot(X)
+    coefficients *= (np.ravel(D) ** n_steps)[:, None]
+    return np.asarray(V.dot(coefficients), dtype=dtype)
 
 
 def _local_var_helper(expressions, distances, eps=1e-16):
@@ -583,6 +747,27 @@ def run_local_variability(
     return local_variability
 
 
+def _run_magic_imputation_np(T, X, n_steps=3, n_jobs=-1, dtype=np.float32, use_gpu=False):
+    # Preparing the operator, T is applied n_steps times instead of computing
+    # the (much denser) matrix power T**n_steps
+    T = csr_matrix(T, dtype=dtype) if issparse(T) else np.asarray(T, dtype=dtype)
+
+    if use_gpu:
+        return _gpu_diffusion_helper(T, X, n_steps, dtype)
+
+    # Define chunks of columns for parallel processing
+    chunks = np.append(np.arange(0, X.shape[1], 100), [X.shape[1]])
+
+    # Run the diffusion in parallel on chunks
+    res = Parallel(n_jobs=n_jobs)(
+        delayed(_diffusion_helper_func)(T, X[:, chunks[i - 1] : chunks[i]], n_steps)
+        for i in range(1, len(chunks))
+    )
+
+    # Stack the results together
+    return np.hstack(res)
+
+
 def run_magic_imputation(
     data: Union[np.ndarray, pd.DataFrame, sc.AnnData, csr_matrix],
     dm_res: Union[dict, None] = None,
@@ -591,6 +776,12 @@ def run_magic_imputation(
     expression_key: str = None,
     imputation_key: str = "MAGIC_imputed_data",
     n_jobs: int = -1,
+    dtype: type = np.float32,
+    use_eigendecomp: bool = False,
+    eigval_key: str = "DM_EigenValues",
+    eigvec_key: str = "DM_EigenVectors",
+    use_gpu: bool = False,
+    kernel_key: str = "DM_Kernel",
 ) -> Union[pd.DataFrame, None, csr_matrix]:
     """
     Run MAGIC imputation on the data.
@@ -614,6 +805,27 @@ def run_magic_imputation(
         Key to store the imputed data in layers of data if it is a sc.AnnData object. Default is 'MAGIC_imputed_data'.
     n_jobs : int, optional
         Number of cores to use for parallel processing. If -1, all available cores are used. Default is -1.
+    dtype : type, optional
+        Floating point type used for the diffusion. Use np.float64 for full precision.
+        Default is np.float32.
+    use_eigendecomp : bool, optional
+        If True, the diffusion is computed from the diffusion components V as
+        V diag(EigenValues**n_steps) U^T X instead of applying the operator n_steps times,
+        where U are the left eigenvectors diag(degrees) V normalized to U^T V = I.
+        This is much faster but only approximates the diffusion within the span of the
+        computed components and requires a symmetric kernel. Default is False.
+    eigval_key : str, optional
+        Key to retrieve EigenValues from data if it is a sc.AnnData object and use_eigendecomp
+        is True. Default is 'DM_EigenValues'.
+    eigvec_key : str, optional
+        Key to retrieve EigenVectors from data if it is a sc.AnnData object and use_eigendecomp
+        is True. Default is 'DM_EigenVectors'.
+    use_gpu : bool, optional
+        Run the sparse products of the diffusion on the GPU. Requires cupy to be installed.
+        Ignored if use_eigendecomp is True. Default is False.
+    kernel_key : str, optional
+        Key to retrieve the kernel, used for the cell degrees, from obsp of data if it is a
+        sc.AnnData object and use_eigendecomp is True. Default is 'DM_Kernel'.
 
     Returns
     -------
@@ -629,8 +841,6 @@ def run_magic_imputation(
             X = data.layers[expression_key]
         else:
             X = data.X
-        if dm_res is None:
-            T = data.obsp[sim_key]
     elif isinstance(data, pd.DataFrame):
         X = data.values
     elif issparse(data):  # assuming csr_matrix
@@ -638,30 +848,28 @@ def run_magic_imputation(
     else:  # assuming np.ndarray
         X = data
 
-    if dm_res is not None:
-        T = dm_res["T"]
-    elif not isinstance(data, sc.AnnData):
+    if dm_res is None and not isinstance(data, sc.AnnData):
         raise ValueError(
             "Diffusion map results (dm_res) must be provided if data is not sc.AnnData"
         )
 
-    # Preparing the operator
-    T_steps = (T**n_steps).astype(np.float32)
-
-    # Define chunks of columns for parallel processing
-    chunks = np.append(np.arange(0, X.shape[1], 100), [X.shape[1]])
-
-    # Run the dot product in parallel on chunks
-    res = Parallel(n_jobs=n_jobs)(
-        delayed(_dot_helper_func)(T_steps, X[:, chunks[i - 1] : chunks[i]])
-        for i in range(1, len(chunks))
-    )
-
-    # Stack the results together
-    if issparse(X):
-        imputed_data = hstack(res).todense()
+    if use_eigendecomp:
+        if dm_res is not None:
+            if "kernel" not in dm_res:
+                raise ValueError(
+                    "Diffusion map results (dm_res) must contain the 'kernel' "
+                    "to use the eigendecomposition."
+                )
+            V, D = dm_res["EigenVectors"], dm_res["EigenValues"]
+            kernel = dm_res["kernel"]
+        else:
+            V, D = data.obsm[eigvec_key], data.uns[eigval_key]
+            kernel = data.obsp[kernel_key]
+        degrees = np.ravel(kernel.sum(axis=1))
+        imputed_data = _eigen_diffusion_helper(V, D, degrees, X, n_steps, dtype)
     else:
-        imputed_data = np.hstack(res)
+        T = dm_res["T"] if dm_res is not None else data.obsp[sim_key]
+        imputed_data = _run_magic_imputation_np(T, X, n_steps, n_jobs, dtype, use_gpu)
 
     # Set small values to zero
     imputed_data[imputed_data < 1e-2] = 0
@@ -724,16 +932,16 @@ def determine_multiscale_space(
 
     if not isinstance(dm_res_dict, dict):
         raise ValueError("'dm_res' should be a dict or a sc.AnnData instance")
+    vals = np.ravel(np.asarray(dm_res_dict["EigenValues"]))
     if n_eigs is None:
-        vals = np.ravel(dm_res_dict["EigenValues"])
-        n_eigs = np.argsort(vals[: (len(vals) - 1)] - vals[1:])[-1] + 1
+        gaps = vals[:-1] - vals[1:]
+        n_eigs = int(np.argmax(gaps)) + 1
         if n_eigs < 3:
-            n_eigs = np.argsort(vals[: (len(vals) - 1)] - vals[1:])[-2] + 1
+            n_eigs = int(np.argpartition(gaps, -2)[-2]) + 1
 
     # Scale the data
-    use_eigs = list(range(1, n_eigs))
-    eig_vals = np.ravel(dm_res_dict["EigenValues"][use_eigs])
-    data = dm_res_dict["EigenVectors"].values[:, use_eigs] * (eig_vals / (1 - eig_vals))
+    eig_vals = vals[1:n_eigs]
+    data = dm_res_dict["EigenVectors"].values[:, 1:n_eigs] * (eig_vals / (1 - eig_vals))
     data = pd.DataFrame(data, index=dm_res_dict["EigenVectors"].index)
 
     if isinstance(dm_res, sc.AnnData):
@@ -835,13 +1043,14 @@ def early_cell(
     if fallback_seed is not None and not isinstance(fallback_seed, int):
         raise ValueError("'fallback_seed' should be an integer")
 
+    labels = ad.obs[celltype_column].values
+    maxes = np.argmax(eigenvectors, axis=0)
+    mins = np.argmin(eigenvectors, axis=0)
     for dcomp in range(eigenvectors.shape[1]):
-        ec = eigenvectors[:, dcomp].argmax()
-        if ad.obs[celltype_column][ec] == celltype:
-            return _return_cell(ec, ad.obs_names, celltype, "max", dcomp)
-        ec = eigenvectors[:, dcomp].argmin()
-        if ad.obs[celltype_column][ec] == celltype:
-            return _return_cell(ec, ad.obs_names, celltype, "min", dcomp)
+        if labels[maxes[dcomp]] == celltype:
+            return _return_cell(maxes[dcomp], ad.obs_names, celltype, "max", dcomp)
+        if labels[mins[dcomp]] == celltype:
+            return _return_cell(mins[dcomp], ad.obs_names, celltype, "min", dcomp)
 
     if fallback_seed is not None:
         print("Falling back to slow early cell detection.")
@@ -910,19 +1119,33 @@ def fallback_terminal_cell(
     return early_cell
 
 
+def _safe_early_cell(ad, celltype, celltype_column, eigvec_key, fallback_seed):
+    try:
+        return early_cell(ad, celltype, celltype_column, eigvec_key, fallback_seed)
+    except CellNotFoundException:
+        warn(
+            f"No valid component found: {celltype} "
+            "Consider increasing the number of diffusion components "
+            "('n_components' in palantir.utils.run_diffusion_maps). "
+            f"The cell type {celltype} will be skipped."
+        )
+        return None
+
+
 def find_terminal_states(
     ad: sc.AnnData,
     celltypes: Iterable,
     celltype_column: str = "celltype",
     eigvec_key: str = "DM_EigenVectors_multiscaled",
     fallback_seed: int = None,
+    n_jobs: int = 1,
 ):
     """
     Identifies terminal states for a list of cell types in the AnnData object.
 
-    This function iterates over the provided cell types, trying to find a terminal cell for each one
-    using the 'early_cell' function. If no valid component is found for a cell type, it emits a warning and
-    proceeds to the next cell type.
+    This function processes the provided cell types, optionally in parallel threads, trying to find a
+    terminal cell for each one using the 'early_cell' function. If no valid component is found for a cell
+    type, it emits a warning and skips that cell type.
 
     Parameters
     ----------
@@ -941,6 +1164,12 @@ def find_terminal_states(
         the fallback method is not applied and CellNotFoundException error is
         raised instead.
         Defaults to None.
+    n_jobs : int, optional
+        Number of threads used to process the cell types in parallel.
+        If -1, all available cores are used. The fallback method runs
+        `run_palantir` on the shared AnnData object and is not thread-safe,
+        so the cell types are processed serially if fallback_seed is set.
+        Default is 1.
 
     Returns
     -------
@@ -948,17 +1177,16 @@ def find_terminal_states(
         A pandas Series where the indices are the cell types and the values are the names of the terminal cells.
         If no terminal cell is found for a cell type, it will not be included in the series.
     """
+    celltypes = list(celltypes)
+    if fallback_seed is not None:
+        n_jobs = 1
+    cells = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(_safe_early_cell)(ad, ct, celltype_column, eigvec_key, fallback_seed)
+        for ct in celltypes
+    )
+
     terminal_states = pd.Series(dtype=str)
-    for ct in celltypes:
-        try:
-            cell = early_cell(ad, ct, celltype_column, eigvec_key, fallback_seed)
-        except CellNotFoundException:
-            warn(
-                f"No valid component found: {ct} "
-                "Consider increasing the number of diffusion components "
-                "('n_components' in palantir.utils.run_diffusion_maps). "
-                f"The cell type {ct} will be skipped."
-            )
-            continue
-        terminal_states[cell] = ct
+    for cell, ct in zip(cells, celltypes):
+        if cell is not None:
+            terminal_states[cell] = ct
     return terminal_states
@@ -0,0 +1,44 @@
+import pytest
+import pandas as pd
+import numpy as np
+from sklearn.neighbors import KNeighborsTransformer
+from sklearn.metrics import adjusted_rand_score
+
+from palantir.presults import cluster_gene_trends
+
+
+class RecordingTransformer(KNeighborsTransformer):
+    calls = 0
+
+    def fit_transform(self, X, y=None):
+        RecordingTransformer.calls += 1
+        return super().fit_transform(X, y)
+
+
+@pytest.fixture
+def mock_trends():
+    rng = np.random.default_rng(0)
+    pseudotime = np.linspace(0, 1, 50)
+    shapes = [pseudotime, 1 - pseudotime, np.sin(np.pi * pseudotime)]
+    trends = np.vstack(
+        [shape + 0.05 * rng.standard_normal((40, 50)) for shape in shapes]
+    )
+    return pd.DataFrame(
+        trends,
+        index=[f"gene_{i}" for i in range(trends.shape[0])],
+        columns=pseudotime,
+    )
+
+
+def test_cluster_gene_trends_transformer(mock_trends):
+    clusters = cluster_gene_trends(mock_trends, "branch", n_neighbors=10)
+
+    RecordingTransformer.calls = 0
+    clusters_transformer = cluster_gene_trends(
+        mock_trends,
+        "branch",
+        n_neighbors=10,
+        transformer=RecordingTransformer(n_neighbors=10),
+    )
+    assert RecordingTransformer.calls == 1
+    assert adjusted_rand_score(clusters, clusters_transformer) == 1
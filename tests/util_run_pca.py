@@ -57,3 +57,26 @@ def test_run_pca_pca_key(mock_anndata):
     run_pca(mock_anndata, pca_key="custom_key")
     assert "custom_key" in mock_anndata.obsm.keys()
     assert mock_anndata.obsm["custom_key"].shape[1] <= 300
+
+
+# Test that the truncated PCA matches the shapes of a fresh fit and the exact SVD
+def test_run_pca_truncation(mock_anndata):
+    fresh = mock_anndata.copy()
+    run_pca(mock_anndata, use_hvg=True)
+    n_comps = mock_anndata.obsm["X_pca"].shape[1]
+
+    sc.pp.pca(fresh, n_comps=n_comps, mask_var="highly_variable", zero_center=False)
+    assert mock_anndata.obsm["X_pca"].shape == fresh.obsm["X_pca"].shape
+    assert mock_anndata.varm["PCs"].shape == fresh.varm["PCs"].shape
+    for key in ["variance", "variance_ratio"]:
+        assert mock_anndata.uns["pca"][key].shape == fresh.uns["pca"][key].shape
+
+    hvg = mock_anndata.var["highly_variable"].values
+    U, S, _ = np.linalg.svd(mock_anndata.X[:, hvg], full_matrices=False)
+    n_leading = 5
+    np.testing.assert_allclose(
+        np.abs(mock_anndata.obsm["X_pca"][:, :n_leading]),
+        np.abs(U[:, :n_leading] * S[:n_leading]),
+        rtol=1e-3,
+        atol=1e-3,
+    )
@@ -4,7 +4,7 @@ import pandas as pd
 import scanpy as sc
 import numpy as np
 
-from palantir.utils import compute_kernel
+from palantir.utils import compute_kernel, _adaptive_std
 
 
 @pytest.fixture
@@ -60,3 +60,67 @@ def test_compute_kernel_pca_key(mock_anndata):
 def test_compute_kernel_kernel_key(mock_anndata):
     kernel = compute_kernel(mock_anndata, kernel_key="custom_kernel")
     assert "custom_kernel" in mock_anndata.obsp.keys()
+
+
+# Test transformer parameter
+def test_compute_kernel_transformer(mock_data):
+    from sklearn.neighbors import KNeighborsTransformer
+
+    kernel = compute_kernel(mock_data, knn=10)
+    kernel_transformer = compute_kernel(
+        mock_data, knn=10, transformer=KNeighborsTransformer(n_neighbors=9)
+    )
+    assert np.allclose(kernel.toarray(), kernel_transformer.toarray())
+
+
+def _reference_kernel(data, knn):
+    # kernel construction before vectorization, used as ground truth
+    N = data.shape[0]
+    temp = sc.AnnData(data.values)
+    sc.pp.neighbors(temp, n_pcs=0, n_neighbors=knn)
+    kNN = temp.obsp["distances"]
+    adaptive_k = int(np.floor(knn / 3))
+    adaptive_std = np.zeros(N)
+    for i in np.arange(N):
+        adaptive_std[i] = np.sort(kNN.data[kNN.indptr[i] : kNN.indptr[i + 1]])[
+            adaptive_k - 1
+        ]
+    x, y, dists = find(kNN)
+    with np.errstate(divide="ignore"):
+        dists /= adaptive_std[x]
+    W = csr_matrix((np.exp(-dists), (x, y)), shape=[N, N])
+    return W + W.T
+
+
+# Test duplicated cells against the reference kernel
+@pytest.mark.parametrize("n_duplicates", [11, 25])
+def test_compute_kernel_duplicated_cells(n_duplicates):
+    data = pd.DataFrame(np.random.rand(300, 10))
+    data.iloc[:n_duplicates] = data.iloc[0].values
+    kernel = compute_kernel(data, knn=30, dtype=np.float64)
+    expected = _reference_kernel(data, knn=30)
+    assert np.allclose(kernel.toarray(), expected.toarray())
+
+
+def _sorted_adaptive_std(kNN, adaptive_k):
+    return np.array(
+        [
+            np.sort(kNN.data[kNN.indptr[i] : kNN.indptr[i + 1]])[adaptive_k - 1]
+            for i in range(kNN.shape[0])
+        ]
+    )
+
+
+# Test the adaptive bandwidth for uniform and variable degree graphs
+@pytest.mark.parametrize("uniform", [True, False])
+def test_adaptive_std(uniform):
+    N = 40
+    degrees = np.full(N, 12) if uniform else np.random.randint(10, 20, size=N)
+    indptr = np.append(0, np.cumsum(degrees))
+    indices = np.concatenate(
+        [np.random.choice(N, size=d, replace=False) for d in degrees]
+    )
+    kNN = csr_matrix((np.random.rand(indptr[-1]), indices, indptr), shape=(N, N))
+
+    adaptive_std = _adaptive_std(kNN, 5)
+    assert np.array_equal(adaptive_std, _sorted_adaptive_std(kNN, 5))
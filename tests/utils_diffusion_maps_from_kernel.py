@@ -55,3 +55,44 @@ def test_determine_multiscale_space(mock_kernel):
     result = diffusion_maps_from_kernel(mock_kernel)
     msresult = determine_multiscale_space(result)
     assert msresult.shape[0] == result["EigenVectors"].shape[0]
+
+
+def test_diffusion_maps_dense_fallback(mock_kernel):
+    with pytest.warns(UserWarning):
+        result = diffusion_maps_from_kernel(mock_kernel, n_components=49)
+
+    assert result["EigenVectors"].shape == (50, 49)
+    assert result["EigenValues"].iloc[0] == approx(1, abs=1e-4)
+
+    sparse_result = diffusion_maps_from_kernel(mock_kernel, n_components=10)
+    for value in sparse_result["EigenValues"]:
+        assert np.min(np.abs(result["EigenValues"].values - value)) < 1e-4
+
+
+@pytest.fixture
+def mock_nonsymmetric_kernel():
+    A = np.random.rand(50, 50)
+    return csr_matrix(A)
+
+
+def test_diffusion_maps_nonsymmetric(mock_nonsymmetric_kernel):
+    result = diffusion_maps_from_kernel(mock_nonsymmetric_kernel)
+
+    T = result["T"].toarray()
+    e_values, _ = eigs(T, 10, tol=1e-4, maxiter=1000)
+    assert np.allclose(
+        result["EigenValues"], np.real(sorted(e_values, reverse=True)[:10]), atol=1e-4
+    )
+    v = result["EigenVectors"].values[:, 0]
+    assert np.allclose(T @ v, v * result["EigenValues"].iloc[0], atol=1e-4)
+
+
+def test_diffusion_maps_nonsymmetric_dense_fallback(mock_nonsymmetric_kernel):
+    with pytest.warns(UserWarning):
+        result = diffusion_maps_from_kernel(mock_nonsymmetric_kernel, n_components=49)
+
+    assert result["EigenVectors"].shape == (50, 49)
+    assert result["EigenValues"].iloc[0] == approx(1, abs=1e-4)
+    T = result["T"].toarray()
+    V = result["EigenVectors"].values
+    assert np.allclose(T @ V[:, 0], V[:, 0])
@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+import pandas as pd
+import scanpy as sc
+
+from palantir.utils import find_terminal_states, _safe_early_cell
+
+
+@pytest.fixture
+def mock_anndata():
+    n_cells = 20
+    ad = sc.AnnData(np.random.rand(n_cells, 5))
+    ad.obs_names = [f"cell_{i}" for i in range(n_cells)]
+    eigenvectors = np.zeros((n_cells, 2))
+    eigenvectors[:, 0] = np.linspace(0, 1, n_cells)
+    eigenvectors[:, 1] = np.linspace(0, 1, n_cells) ** 2
+    eigenvectors[5, 1] = 2
+    ad.obsm["DM_EigenVectors_multiscaled"] = eigenvectors
+    celltypes = np.array(["b"] * n_cells, dtype=object)
+    celltypes[0] = "a"
+    celltypes[-1] = "c"
+    celltypes[5] = "d"
+    celltypes[10] = "e"
+    ad.obs["celltype"] = celltypes
+    return ad
+
+
+def test_safe_early_cell(mock_anndata):
+    cell = _safe_early_cell(
+        mock_anndata, "a", "celltype", "DM_EigenVectors_multiscaled", None
+    )
+    assert cell == "cell_0"
+    with pytest.warns(UserWarning):
+        cell = _safe_early_cell(
+            mock_anndata, "e", "celltype", "DM_EigenVectors_multiscaled", None
+        )
+    assert cell is None
+
+
+def test_find_terminal_states(mock_anndata):
+    with pytest.warns(UserWarning):
+        terminal_states = find_terminal_states(mock_anndata, ["a", "c", "d", "e"])
+    assert isinstance(terminal_states, pd.Series)
+    assert terminal_states.to_dict() == {"cell_0": "a", "cell_19": "c", "cell_5": "d"}
+
+
+def test_find_terminal_states_n_jobs(mock_anndata):
+    celltypes = ["a", "c", "d"]
+    serial = find_terminal_states(mock_anndata, celltypes)
+    parallel = find_terminal_states(mock_anndata, celltypes, n_jobs=-1)
+    assert serial.equals(parallel)
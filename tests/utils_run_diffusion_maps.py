@@ -53,3 +53,23 @@ def test_run_diffusion_maps_exceptions():
     # Test with neither pd.DataFrame nor sc.AnnData
     with pytest.raises(ValueError):
         run_diffusion_maps("invalid_type")
+
+
+def test_run_diffusion_maps_dtype():
+    df = mock_dataframe(50, 30)
+    result = run_diffusion_maps(df)
+    assert result["kernel"].dtype == np.float32
+    assert result["T"].dtype == np.float32
+
+    result = run_diffusion_maps(df, dtype=np.float64)
+    assert result["kernel"].dtype == np.float64
+    assert result["T"].dtype == np.float64
+
+
+def test_run_diffusion_maps_sparse_kernel_dtype():
+    A = np.random.rand(50, 50)
+    kernel = csr_matrix((A + A.T) / 2)
+    with pytest.warns(UserWarning):
+        result = run_diffusion_maps(kernel)
+    assert result["kernel"].dtype == np.float32
+    assert result["T"].dtype == np.float32
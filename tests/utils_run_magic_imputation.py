@@ -2,9 +2,14 @@ import pytest
 import numpy as np
 import pandas as pd
 import scanpy as sc
+import palantir.utils
 from scipy.sparse import csr_matrix
 
-from palantir.utils import run_magic_imputation
+from palantir.utils import (
+    run_magic_imputation,
+    run_diffusion_maps,
+    diffusion_maps_from_kernel,
+)
 
 
 @pytest.fixture
@@ -69,3 +74,76 @@ def test_run_magic_imputation_missing_expression_key():
     data.obsp["DM_Similarity"] = np.random.rand(50, 50)
     with pytest.raises(ValueError):
         run_magic_imputation(data, expression_key="missing_key")
+
+
+# Test that the diffusion matches the dense matrix power
+def test_run_magic_imputation_matches_matrix_power(mock_dm_res):
+    data = np.random.rand(50, 20)
+    result = run_magic_imputation(data, dm_res=mock_dm_res, n_steps=3)
+    T = mock_dm_res["T"].toarray()
+    expected = np.linalg.matrix_power(T, 3) @ data
+    expected[expected < 1e-2] = 0
+    assert np.allclose(result, expected, rtol=1e-4)
+
+
+# Test the public sparse product fallback against the default path
+def test_run_magic_imputation_without_csr_matvecs(mock_dm_res, monkeypatch):
+    data = np.random.rand(50, 20)
+    expected = run_magic_imputation(data, dm_res=mock_dm_res, n_jobs=1)
+    monkeypatch.setattr(palantir.utils, "csr_matvecs", None)
+    result = run_magic_imputation(data, dm_res=mock_dm_res, n_jobs=1)
+    assert np.allclose(result, expected, rtol=1e-5)
+
+
+# Test diffusion through the eigendecomposition against the exact diffusion
+def test_run_magic_imputation_eigendecomp():
+    pca = pd.DataFrame(np.random.rand(500, 5))
+    dm_res_10 = run_diffusion_maps(pca, n_components=10)
+    dm_res_50 = diffusion_maps_from_kernel(dm_res_10["kernel"], n_components=50)
+    dm_res_50["kernel"] = dm_res_10["kernel"]
+    data = csr_matrix(np.random.rand(500, 20) + 1)
+    exact = run_magic_imputation(data, dm_res=dm_res_10)
+
+    errors = list()
+    for dm_res in [dm_res_10, dm_res_50]:
+        result = run_magic_imputation(data, dm_res=dm_res, use_eigendecomp=True)
+        assert isinstance(result, np.ndarray)
+        assert result.shape == (500, 20)
+        errors.append(np.linalg.norm(result - exact) / np.linalg.norm(exact))
+    assert errors[0] < 2e-2
+    assert errors[1] < errors[0] / 5
+
+
+# Test diffusion through the eigendecomposition with AnnData
+def test_run_magic_imputation_anndata_eigendecomp():
+    data = sc.AnnData(np.random.rand(500, 20) + 1)
+    data.obsm["X_pca"] = np.random.rand(500, 5)
+    run_diffusion_maps(data, n_components=50)
+    exact = run_magic_imputation(data, imputation_key="exact")
+    result = run_magic_imputation(data, use_eigendecomp=True)
+    assert "MAGIC_imputed_data" in data.layers
+    assert result.shape == (500, 20)
+    assert np.linalg.norm(result - exact) / np.linalg.norm(exact) < 2e-3
+
+
+# Test eigendecomposition without the kernel in dm_res
+def test_run_magic_imputation_eigendecomp_missing_kernel():
+    A = np.random.rand(50, 50)
+    dm_res = diffusion_maps_from_kernel(csr_matrix((A + A.T) / 2))
+    with pytest.raises(ValueError):
+        run_magic_imputation(
+            np.random.rand(50, 20), dm_res=dm_res, use_eigendecomp=True
+        )
+
+
+# Test GPU diffusion without cupy installed
+def test_run_magic_imputation_gpu_missing_cupy(mock_dm_res):
+    try:
+        import cupy  # noqa: F401
+
+        pytest.skip("cupy is installed")
+    except ModuleNotFoundError:
+        pass
+    data = np.random.rand(50, 20)
+    with pytest.raises(Exception, match="cupy"):
+        run_magic_imputation(data, dm_res=mock_dm_res, use_gpu=True)